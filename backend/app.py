@@ -1,24 +1,45 @@
 import os
 import sys
 import time
+import asyncio
 import logging
-from logging.handlers import RotatingFileHandler
-from collections import defaultdict
-from typing import Dict, Any
-
-from fastapi import FastAPI, Request, HTTPException, Header, Depends
-from fastapi.responses import JSONResponse
+import queue
+import hashlib
+import functools
+import sqlite3
+from array import array
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from concurrent.futures import ThreadPoolExecutor
+from logging.handlers import RotatingFileHandler, QueueHandler, QueueListener
+from threading import Lock
+from typing import Dict, Any, List, Optional
+from urllib.parse import parse_qs
+
+import orjson
+from fastapi import APIRouter, FastAPI, HTTPException, Header, Depends, Request
+from fastapi.responses import JSONResponse, HTMLResponse
 from fastapi.exceptions import RequestValidationError
 from fastapi.middleware.cors import CORSMiddleware
 
 from . import schemas
-from .recommender import Recommender
+from .recommender import Recommender, models_version
 from .sentiment import SentimentModel
 from .train_cf import build_and_save_cf
 from . import config
-from .db import get_connection
+from .db import get_connection, enable_wal, ensure_schema
 from .analytics import get_popular_activities, get_user_analytics
 
+try:
+    from pyinstrument import Profiler
+except ImportError:  # dev-only dependency
+    Profiler = None
+
+try:
+    import xxhash
+except ImportError:  # optional; ETags fall back to blake2b
+    xxhash = None
+
 
 # -----------------------
 # Logging
@@ -28,6 +49,7 @@ LOG_FILE = os.path.join(config.LOG_DIR, "app.log")
 
 logger = logging.getLogger("ActiReco")
 logger.setLevel(logging.INFO if not config.DEBUG else logging.DEBUG)
+logger.propagate = False  # has its own handlers; don't duplicate via root
 
 console_handler = logging.StreamHandler(sys.stdout)
 console_handler.setFormatter(logging.Formatter("%(asctime)s | %(levelname)s | %(message)s"))
@@ -35,87 +57,316 @@ console_handler.setFormatter(logging.Formatter("%(asctime)s | %(levelname)s | %(
 file_handler = RotatingFileHandler(LOG_FILE, maxBytes=5 * 1024 * 1024, backupCount=3)
 file_handler.setFormatter(logging.Formatter("%(asctime)s | %(levelname)s | %(message)s"))
 
+# request threads only enqueue records; the listener thread (started on
+# app startup) does the actual console/file writes
+log_queue = queue.Queue(-1)
+log_listener = QueueListener(log_queue, console_handler, file_handler)
+
 if not logger.handlers:
-    logger.addHandler(console_handler)
-    logger.addHandler(file_handler)
+    logger.addHandler(QueueHandler(log_queue))
+
+# the logger is process-wide, so the listener is shared by every app built
+# here; it runs while at least one app's lifespan is active
+_log_listener_users = 0
+_log_listener_lock = Lock()
+
+
+def _start_log_listener():
+    global _log_listener_users
+    with _log_listener_lock:
+        if _log_listener_users == 0:
+            log_listener.start()
+        _log_listener_users += 1
+
+
+def _stop_log_listener():
+    global _log_listener_users
+    with _log_listener_lock:
+        _log_listener_users -= 1
+        if _log_listener_users == 0:
+            log_listener.stop()
 
 
 # -----------------------
-# App
+# Responses
 # -----------------------
-app = FastAPI(title="ActiReco API", version="0.4.0")
+class ORJSONResponse(JSONResponse):
+    """JSONResponse encoded with orjson (C encoder, handles NumPy values)."""
+
+    def render(self, content: Any) -> bytes:
+        return orjson.dumps(content, option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS)
+
 
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["*"],
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
+# -----------------------
+# Startup / Shutdown
+# -----------------------
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    _start_log_listener()
+    logger.info("Starting ActiReco...")
 
-app.state.recommender = None
-app.state.sentiment_model = None
+    # newer FastAPI keeps an included router as a single entry in app.routes,
+    # so register the API router's paths explicitly alongside the docs routes
+    metrics = app.state.metrics
+    metrics.register(route.path for route in app.routes if hasattr(route, "path"))
+    metrics.register(route.path for route in router.routes)
+
+    enable_wal()
+    # older databases lack columns the interaction writer inserts into
+    ensure_schema()
+
+    app.state.recommender = Recommender()
+    app.state.sentiment_model = SentimentModel()
+
+    # pay JIT / BLAS / first-forward-pass costs before the first request
+    app.state.recommender.warm_up()
+    app.state.sentiment_model.warm_up()
+
+    # dedicated pool for recommender inference so CPU-bound requests don't
+    # starve the shared anyio threadpool used by other sync endpoints
+    app.state.rec_executor = ThreadPoolExecutor(
+        max_workers=config.REC_THREADS, thread_name_prefix="recommender"
+    )
+
+    app.state.interaction_queue = asyncio.Queue()
+    writer = asyncio.create_task(
+        interaction_writer(app.state.interaction_queue, app.state.interaction_stats)
+    )
+    refresher = asyncio.create_task(seen_refresher(app.state))
+
+    yield
+
+    logger.info("Shutting down ActiReco...")
+
+    refresher.cancel()
+    try:
+        await refresher
+    except asyncio.CancelledError:
+        pass
+
+    # sentinel: flush whatever is still queued, then stop
+    await app.state.interaction_queue.put(None)
+    await writer
+
+    await app.state.sentiment_model.close()
+    app.state.rec_executor.shutdown()
+    _stop_log_listener()
 
 
 # -----------------------
-# Metrics
+# Recommender executor
 # -----------------------
-metrics_data: Dict[str, Dict[str, Any]] = defaultdict(
-    lambda: {"count": 0, "total_latency": 0.0, "avg_latency": 0.0}
-)
+async def run_recommender(executor: ThreadPoolExecutor, recommender: Recommender, **kwargs):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        executor, functools.partial(recommender.recommend, **kwargs)
+    )
 
 
 # -----------------------
-# Middleware
+# Metrics
 # -----------------------
-@app.middleware("http")
-async def log_latency(request: Request, call_next):
-    start = time.time()
+UNMATCHED_ROUTE = "<unmatched>"
 
-    try:
-        response = await call_next(request)
-    except Exception as e:
-        logger.exception(str(e))
-        return JSONResponse(status_code=500, content={"status": "error"})
 
-    latency = (time.time() - start) * 1000
-    path = request.url.path
+class EndpointMetrics:
+    """
+    Per-route request counts and summed latency. Route templates get a fixed
+    slot in two flat arrays, assigned at startup so the request path never
+    inserts or locks. Requests that match no registered route (404 probes)
+    all share the UNMATCHED_ROUTE slot.
+    """
 
-    m = metrics_data[path]
-    m["count"] += 1
-    m["total_latency"] += latency
-    m["avg_latency"] = m["total_latency"] / m["count"]
+    def __init__(self):
+        self._index: Dict[str, int] = {}
+        self._counts = array("Q")
+        self._latency = array("d")
+        self.register([UNMATCHED_ROUTE])
 
-    logger.info(f"{request.method} {path} {latency:.2f}ms")
+    def register(self, paths):
+        for p in paths:
+            self._index.setdefault(p, len(self._index))
 
-    return response
+        missing = len(self._index) - len(self._counts)
+        self._counts.extend([0] * missing)
+        self._latency.extend([0.0] * missing)
+
+    def record(self, route: str, latency: float):
+        idx = self._index.get(route)
+        if idx is None:
+            idx = self._index[UNMATCHED_ROUTE]
+
+        self._counts[idx] += 1
+        self._latency[idx] += latency
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        out = {}
+        for p, idx in list(self._index.items()):
+            c, t = self._counts[idx], self._latency[idx]
+            if c:
+                out[p] = {"count": c, "total_latency": t, "avg_latency": t / c}
+        return out
 
 
 # -----------------------
-# Startup
+# Middleware
 # -----------------------
-@app.on_event("startup")
-def startup():
-    logger.info("Starting ActiReco...")
+class LatencyMiddleware:
+    """Pure ASGI latency recorder (avoids BaseHTTPMiddleware overhead)."""
+
+    def __init__(self, app, metrics: EndpointMetrics):
+        self.app = app
+        self.metrics = metrics
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        path = scope["path"]
 
-    app.state.recommender = Recommender()
-    app.state.sentiment_model = SentimentModel()
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                latency = (time.perf_counter() - start) * 1000
+
+                # key on the route template (/analytics/user/{user_id}), not
+                # the concrete path; plain Starlette routes (docs) don't set
+                # "route", but their paths are static and registered as-is
+                route = scope.get("route")
+                self.metrics.record(route.path if route is not None else path, latency)
+
+                logger.info("%s %s %.2fms", scope["method"], path, latency)
+
+            await send(message)
+
+        await self.app(scope, receive, send_wrapper)
+
+
+def _etag(body: bytes) -> bytes:
+    if xxhash is not None:
+        digest = xxhash.xxh3_64(body).hexdigest()
+    else:
+        digest = hashlib.blake2b(body, digest_size=8).hexdigest()
+    return f'"{digest}"'.encode("latin-1")
+
+
+def _etag_matches(if_none_match: bytes, etag: bytes) -> bool:
+    """
+    If-None-Match uses weak comparison (RFC 7232 §3.2): "*" matches anything,
+    otherwise any tag in the comma-separated list, with or without W/, does.
+    """
+    if if_none_match.strip() == b"*":
+        return True
+
+    for tag in if_none_match.split(b","):
+        tag = tag.strip()
+        if tag.startswith(b"W/"):
+            tag = tag[2:]
+        if tag == etag:
+            return True
+    return False
+
+
+class ETagMiddleware:
+    """Adds ETags to successful GET responses and answers If-None-Match with 304."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] != "GET":
+            await self.app(scope, receive, send)
+            return
+
+        start = None
+        chunks = []
+
+        async def buffer(message):
+            nonlocal start
+            if message["type"] == "http.response.start":
+                start = message
+            elif message["type"] == "http.response.body":
+                chunks.append(message.get("body", b""))
+                if not message.get("more_body", False):
+                    await self._respond(scope, start, b"".join(chunks), send)
+            else:
+                await send(message)
+
+        await self.app(scope, receive, buffer)
+
+    @staticmethod
+    async def _respond(scope, start, body, send):
+        if start["status"] != 200:
+            await send(start)
+            await send({"type": "http.response.body", "body": body})
+            return
+
+        etag = _etag(body)
+        # repeated header lines are equivalent to one comma-joined list
+        if_none_match = b",".join(v for k, v in scope["headers"] if k == b"if-none-match")
+
+        if if_none_match and _etag_matches(if_none_match, etag):
+            headers = [
+                (k, v) for k, v in start["headers"]
+                if k.lower() not in (b"content-length", b"content-type")
+            ]
+            await send({"type": "http.response.start", "status": 304, "headers": headers + [(b"etag", etag)]})
+            await send({"type": "http.response.body", "body": b""})
+            return
+
+        start["headers"] = list(start["headers"]) + [(b"etag", etag)]
+        await send(start)
+        await send({"type": "http.response.body", "body": body})
+
+
+class ProfilerMiddleware:
+    """On-demand pyinstrument profile: ?profile=1 plus a valid X-API-Key."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self._requested(scope):
+            await self.app(scope, receive, send)
+            return
+
+        async def discard(message):
+            pass
+
+        profiler = Profiler(async_mode="enabled")
+        profiler.start()
+        try:
+            await self.app(scope, receive, discard)
+        finally:
+            profiler.stop()
+
+        await HTMLResponse(profiler.output_html())(scope, receive, send)
+
+    @staticmethod
+    def _requested(scope) -> bool:
+        query = parse_qs(scope.get("query_string", b"").decode("latin-1"))
+        if query.get("profile") != ["1"]:
+            return False
+
+        if not config.ADMIN_API_KEY:
+            return config.DEBUG
+
+        headers = dict(scope["headers"])
+        return headers.get(b"x-api-key", b"").decode("latin-1") == config.ADMIN_API_KEY
 
 
 # -----------------------
 # Exceptions
 # -----------------------
-@app.exception_handler(HTTPException)
 async def http_handler(request, exc):
     return JSONResponse(status_code=exc.status_code, content={"error": exc.detail})
 
 
-@app.exception_handler(RequestValidationError)
 async def validation_handler(request, exc):
     return JSONResponse(status_code=422, content={"error": exc.errors()})
 
 
-@app.exception_handler(Exception)
 async def global_handler(request, exc):
     logger.exception(str(exc))
     return JSONResponse(status_code=500, content={"error": "internal"})
@@ -124,7 +375,8 @@ async def global_handler(request, exc):
 # -----------------------
 # Auth
 # -----------------------
-def verify_admin_key(x_api_key: str = Header(...)):
+def verify_admin_key(x_api_key: Optional[str] = Header(None)):
+    # optional header: a missing key is a 403 (or 503), not a validation error
     if not config.ADMIN_API_KEY:
         raise HTTPException(status_code=503, detail="Admin not configured")
 
@@ -134,54 +386,292 @@ def verify_admin_key(x_api_key: str = Header(...)):
     return True
 
 
+# -----------------------
+# Response caches
+# -----------------------
+class TTLCache:
+    """Small LRU with per-entry expiry. Only used from the event loop, so no locking."""
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data: "OrderedDict[bytes, tuple]" = OrderedDict()
+
+    def get(self, key: bytes):
+        entry = self._data.get(key)
+        if entry is not None:
+            if time.monotonic() - entry[0] < self.ttl:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            del self._data[key]
+
+        self.misses += 1
+        return None
+
+    def put(self, key: bytes, value):
+        self._data[key] = (time.monotonic(), value)
+        self._data.move_to_end(key)
+        if len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def clear(self):
+        self._data.clear()
+
+    def info(self) -> Dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses, "size": len(self._data), "maxsize": self.maxsize}
+
+
+async def cached_mood(state, text: str) -> str:
+    key = hashlib.sha256(text.encode("utf-8")).digest()
+
+    mood = state.sentiment_cache.get(key)
+    if mood is not None:
+        return mood
+
+    model = state.sentiment_model
+    mood = await model.analyze_async(text)
+
+    if model.classifier is not None:  # don't pin fallback answers for the whole TTL
+        state.sentiment_cache.put(key, mood)
+
+    return mood
+
+
+# -----------------------
+# Interaction writer
+# -----------------------
+# /log_interaction only enqueues; one background task batches the inserts.
+# A flush that fails on lock contention keeps its rows and retries them (ahead
+# of newer rows) on the next flush, or after LOG_RETRY_INTERVAL if nothing new
+# arrives; only rows beyond LOG_MAX_PENDING are dropped. Any other failure
+# (schema mismatch, corrupt file) won't fix itself, so those rows are dropped
+# right away. All of it is counted in /metrics.
+LOG_BATCH_SIZE = 64
+LOG_FLUSH_INTERVAL = 0.1  # seconds
+LOG_RETRY_INTERVAL = 5.0  # seconds
+LOG_MAX_PENDING = 10_000
+
+
+def new_interaction_stats() -> Dict[str, int]:
+    return {"written": 0, "failed_flushes": 0, "pending": 0, "dropped": 0}
+
+
+def _flush_interactions(rows, db_path=None):
+    conn = get_connection(db_path)
+    try:
+        conn.executemany("""
+            INSERT INTO interactions (user_id, activity_id, event, rating)
+            VALUES (?, ?, ?, ?)
+        """, rows)
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def _is_transient(exc: Exception) -> bool:
+    msg = str(exc)
+    return isinstance(exc, sqlite3.OperationalError) and ("locked" in msg or "busy" in msg)
+
+
+async def interaction_writer(queue: asyncio.Queue, stats: Dict[str, int], db_path: str = None):
+    loop = asyncio.get_running_loop()
+    pending: List[tuple] = []  # rows from failed flushes
+    stopping = False
+
+    while not stopping:
+        batch = []
+        try:
+            # with rows awaiting a retry, wake up even if nothing new arrives
+            row = await asyncio.wait_for(queue.get(), LOG_RETRY_INTERVAL if pending else None)
+        except asyncio.TimeoutError:
+            row = ()
+
+        if row is None:
+            stopping = True
+        elif row:
+            batch.append(row)
+            deadline = loop.time() + LOG_FLUSH_INTERVAL
+
+            while len(batch) < LOG_BATCH_SIZE:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    row = await asyncio.wait_for(queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                if row is None:
+                    stopping = True
+                    break
+                batch.append(row)
+
+        rows = pending + batch
+        if not rows:
+            continue
+
+        try:
+            await loop.run_in_executor(None, _flush_interactions, rows, db_path)
+        except Exception as e:
+            stats["failed_flushes"] += 1
+            if _is_transient(e):
+                pending = rows[-LOG_MAX_PENDING:]
+                logger.warning("Failed to write %d interactions (%d kept for retry): %s", len(rows), len(pending), e)
+            else:
+                pending = []
+                logger.exception("Dropping %d interactions, write failed: %s", len(rows), e)
+            stats["dropped"] += len(rows) - len(pending)
+        else:
+            stats["written"] += len(rows)
+            pending = []
+
+        stats["pending"] = len(pending)
+
+    if pending:
+        stats["dropped"] += len(pending)
+        stats["pending"] = 0
+        logger.error("Dropping %d unwritten interactions on shutdown", len(pending))
+
+
+# -----------------------
+# Seen-index / model refresh
+# -----------------------
+# Each worker process keeps its own in-memory seen index and only marks its
+# own /log_interaction calls; this picks up rows written by the other workers.
+# /admin/retrain_cf only swaps the model in the worker that served it, so the
+# same loop reloads the Recommender once the CF artifacts on disk change.
+SEEN_REFRESH_INTERVAL = 2.0  # seconds
+
+
+def swap_recommender(state, recommender: Recommender):
+    """
+    Install a freshly loaded Recommender. Cached responses only hold the
+    generation number, so dropping them here releases the old model's arrays.
+    """
+    state.recommender = recommender
+    state.model_generation += 1
+    state.recommend_mood_cache.clear()
+
+
+def _load_recommender(models_dir: str = None) -> Recommender:
+    recommender = Recommender(models_dir=models_dir)
+    recommender.warm_up()
+    return recommender
+
+
+async def reload_if_retrained(state):
+    models_dir = state.recommender.models_dir
+    if models_version(models_dir) == state.recommender.models_version:
+        return
+
+    loop = asyncio.get_running_loop()
+    recommender = await loop.run_in_executor(None, _load_recommender, models_dir)
+    swap_recommender(state, recommender)
+    logger.info("Reloaded recommender after CF retrain (generation %d)", state.model_generation)
+
+
+async def seen_refresher(state):
+    loop = asyncio.get_running_loop()
+
+    while True:
+        await asyncio.sleep(SEEN_REFRESH_INTERVAL)
+        try:
+            await reload_if_retrained(state)
+        except Exception as e:
+            logger.warning("Recommender reload failed: %s", e)
+        try:
+            await loop.run_in_executor(None, state.recommender.refresh_seen)
+        except Exception as e:
+            logger.warning("Seen index refresh failed: %s", e)
+
+
 # -----------------------
 # Core APIs
 # -----------------------
-@app.get("/health")
+router = APIRouter()
+
+
+@router.get("/health")
 def health():
     return {"status": "ok"}
 
 
-@app.get("/metrics")
-def metrics():
-    return {"endpoints": metrics_data}
+@router.get("/metrics")
+def metrics(request: Request):
+    state = request.app.state
+    return {
+        "endpoints": state.metrics.snapshot(),
+        "sentiment_cache": state.sentiment_cache.info(),
+        "recommend_mood_cache": state.recommend_mood_cache.info(),
+        "interactions": state.interaction_stats,
+    }
 
 
-@app.post("/sentiment", response_model=schemas.SentimentResponse)
-def sentiment(req: schemas.SentimentRequest):
-    mood = app.state.sentiment_model.analyze(req.text)
+@router.post("/sentiment", response_model=schemas.SentimentResponse)
+async def sentiment(req: schemas.SentimentRequest, request: Request):
+    mood = await cached_mood(request.app.state, req.text)
     return {"text": req.text, "mood": mood}
 
 
-@app.post("/recommend", response_model=schemas.RecommendationResponse)
-def recommend(req: schemas.RecommendRequest):
-    items = app.state.recommender.recommend(**req.dict())
+def _recommend_args(req: schemas.RecommendRequest) -> Dict[str, Any]:
+    """Map a RecommendRequest onto Recommender.recommend() keyword arguments."""
+    return {
+        "user_id": req.user_id,
+        "top_k": req.top_k,
+        "city": req.city,
+        "tags": req.tags,
+        "filter_seen": not req.include_seen,
+        "alpha_override": req.alpha,
+        "interests_override": req.interests_override,
+    }
+
+
+@router.post("/recommend", response_model=schemas.RecommendationResponse)
+async def recommend(req: schemas.RecommendRequest, request: Request):
+    state = request.app.state
+    items = await run_recommender(state.rec_executor, state.recommender, **_recommend_args(req))
     return {"user_id": req.user_id, "recommendations": items}
 
 
-@app.post("/recommend_with_mood", response_model=schemas.RecommendationResponse)
-def recommend_mood(req: schemas.RecommendRequest):
-    mood = app.state.sentiment_model.analyze(req.mood_text) if req.mood_text else None
-    items = app.state.recommender.recommend(**req.dict(), mood=mood)
-    return {"user_id": req.user_id, "mood": mood, "recommendations": items}
+@router.post("/recommend_with_mood", response_model=schemas.RecommendationResponse)
+async def recommend_mood(req: schemas.RecommendRequest, request: Request):
+    state = request.app.state
+    recommender = state.recommender
+
+    # the user's seen version is part of the key, so logging an interaction
+    # invalidates their cached responses (seen items are filtered out)
+    params = req.model_dump()
+    params["seen_version"] = recommender.seen_version(req.user_id)
+    params["model_generation"] = state.model_generation
+    key = hashlib.blake2b(orjson.dumps(params, option=orjson.OPT_SORT_KEYS), digest_size=16).digest()
 
+    cached = state.recommend_mood_cache.get(key)
+    if cached is not None:
+        return cached
 
-@app.post("/log_interaction", response_model=schemas.LogInteractionResponse)
-def log_interaction(req: schemas.LogInteractionRequest):
+    mood = await cached_mood(state, req.mood_text) if req.mood_text else None
+    items = await run_recommender(state.rec_executor, recommender, **_recommend_args(req), mood=mood)
+    response = {"user_id": req.user_id, "mood": mood, "recommendations": items}
+
+    state.recommend_mood_cache.put(key, response)
+    return response
+
+
+@router.post("/log_interaction", response_model=schemas.LogInteractionResponse)
+async def log_interaction(req: schemas.LogInteractionRequest, request: Request):
+    state = request.app.state
 
     if req.event == "rate" and req.rating is None:
         raise HTTPException(status_code=400, detail="Rating required")
 
-    conn = get_connection()
-    cursor = conn.cursor()
-
-    cursor.execute("""
-        INSERT INTO interactions (user_id, activity_id, event, rating)
-        VALUES (?, ?, ?, ?)
-    """, (req.user_id, req.activity_id, req.event, req.rating))
+    await state.interaction_queue.put(
+        (req.user_id, req.activity_id, req.event, req.rating)
+    )
 
-    conn.commit()
-    conn.close()
+    if state.recommender is not None:
+        state.recommender.mark_seen(req.user_id, req.activity_id)
 
     return {"status": "ok"}
 
@@ -189,12 +679,12 @@ def log_interaction(req: schemas.LogInteractionRequest):
 # -----------------------
 # 🔥 ANALYTICS APIs
 # -----------------------
-@app.get("/analytics/popular")
+@router.get("/analytics/popular")
 def popular():
     return {"data": get_popular_activities()}
 
 
-@app.get("/analytics/user/{user_id}")
+@router.get("/analytics/user/{user_id}")
 def user_analytics(user_id: str):
     return get_user_analytics(user_id)
 
@@ -202,8 +692,67 @@ def user_analytics(user_id: str):
 # -----------------------
 # Admin
 # -----------------------
-@app.post("/admin/retrain_cf", dependencies=[Depends(verify_admin_key)])
-def retrain(req: schemas.RetrainCFRequest):
-    build_and_save_cf(n_factors=req.n_factors)
-    app.state.recommender = Recommender()
-    return {"status": "ok"}
\ No newline at end of file
+@router.post("/admin/retrain_cf", dependencies=[Depends(verify_admin_key)])
+async def retrain(req: schemas.RetrainCFRequest, request: Request):
+    loop = asyncio.get_running_loop()
+    await loop.run_in_executor(None, functools.partial(build_and_save_cf, n_factors=req.n_factors))
+    # this worker swaps now; the others pick the new artifacts up in seen_refresher
+    await reload_if_retrained(request.app.state)
+    return {"status": "ok"}
+
+
+# -----------------------
+# App
+# -----------------------
+def create_app() -> FastAPI:
+    """
+    Build the ActiReco app. Models are loaded by the lifespan handler, so
+    constructing the app is cheap; uvicorn calls this per worker (factory=True).
+    """
+    app = FastAPI(
+        title="ActiReco API",
+        version="0.4.0",
+        lifespan=lifespan,
+        default_response_class=ORJSONResponse,
+    )
+
+    app.state.recommender = None
+    app.state.sentiment_model = None
+
+    # per-app, so apps built in one process (tests, reloads) don't share counters
+    app.state.metrics = EndpointMetrics()
+
+    # sha256(text) -> mood
+    app.state.sentiment_cache = TTLCache(maxsize=4096, ttl=3600)
+
+    # blake2b(request body, user's seen version, model generation) -> response
+    app.state.recommend_mood_cache = TTLCache(maxsize=10000, ttl=300)
+    app.state.model_generation = 0
+
+    app.state.interaction_stats = new_interaction_stats()
+
+    app.include_router(router)
+
+    app.add_exception_handler(HTTPException, http_handler)
+    app.add_exception_handler(RequestValidationError, validation_handler)
+    app.add_exception_handler(Exception, global_handler)
+
+    # added innermost first: the last one added wraps all the others
+    app.add_middleware(
+        CORSMiddleware,
+        allow_origins=["*"],
+        allow_credentials=True,
+        allow_methods=["*"],
+        allow_headers=["*"],
+    )
+    app.add_middleware(LatencyMiddleware, metrics=app.state.metrics)
+    app.add_middleware(ETagMiddleware)
+
+    if Profiler is not None and (config.DEBUG or config.ADMIN_API_KEY):
+        app.add_middleware(ProfilerMiddleware)
+
+    return app
+
+
+# module-level instance for `uvicorn backend.app:app` and existing imports
+app = create_app()
\ No newline at end of file
@@ -13,6 +13,12 @@ ADMIN_API_KEY: Optional[str] = os.getenv("ADMIN_API_KEY")  # keep optional; enfo
 HOST: str = os.getenv("HOST", "127.0.0.1")
 PORT: int = int(os.getenv("PORT", "8000"))
 DEBUG: bool = os.getenv("DEBUG", "false").lower() in ("1", "true", "yes")
+WORKERS: int = int(os.getenv("WORKERS", str(os.cpu_count() or 1)))  # ignored when DEBUG (reload)
+if WORKERS < 1:
+    raise ValueError(f"WORKERS must be >= 1, got {WORKERS}")
+# recommender inference threads per process; by default the cores are split
+# across workers rather than every worker sizing its pool to all of them
+REC_THREADS: int = int(os.getenv("REC_THREADS", "0")) or max(1, (os.cpu_count() or 1) // (1 if DEBUG else WORKERS))
 
 # Paths
 LOG_DIR: str = os.path.join(base_dir, "logs")
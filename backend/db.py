@@ -6,13 +6,30 @@ BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
 DB_PATH = os.path.join(BASE_DIR, "actireco.db")
 
 
-def get_connection():
-    conn = sqlite3.connect(DB_PATH)
+def get_connection(path=None):
+    conn = sqlite3.connect(path or DB_PATH)
     conn.row_factory = sqlite3.Row  # better dict-like access
+    # NORMAL is durable enough under WAL and saves an fsync per commit; in
+    # rollback-journal mode it would weaken durability, so keep the default
+    if conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal":
+        conn.execute("PRAGMA synchronous=NORMAL")
     return conn
 
 
+def enable_wal():
+    # WAL lets readers (recommender, analytics) run alongside the interaction
+    # writer. The mode is stored in the database file itself, so only switch
+    # (and rewrite the header) when it isn't set yet
+    conn = sqlite3.connect(DB_PATH)
+    try:
+        if conn.execute("PRAGMA journal_mode").fetchone()[0] != "wal":
+            conn.execute("PRAGMA journal_mode=WAL")
+    finally:
+        conn.close()
+
+
 def init_db():
+    enable_wal()
     conn = get_connection()
     cursor = conn.cursor()
 
@@ -62,4 +79,29 @@ def init_db():
     cursor.execute("CREATE INDEX IF NOT EXISTS idx_activity ON interactions(activity_id)")
 
     conn.commit()
-    conn.close()
\ No newline at end of file
+    conn.close()
+
+    ensure_schema()
+
+
+# columns the API writes that older databases (e.g. interactions loaded from
+# interactions.csv by migrate.py) may lack
+REQUIRED_COLUMNS = {
+    "interactions": {"event": "TEXT"},
+}
+
+
+def ensure_schema(path=None):
+    """Add any missing REQUIRED_COLUMNS; a no-op (no writes) once they exist."""
+    conn = get_connection(path)
+    try:
+        for table, columns in REQUIRED_COLUMNS.items():
+            existing = {row["name"] for row in conn.execute(f"PRAGMA table_info({table})")}
+            if not existing:
+                continue  # table not created yet; init_db / migrate own that
+            for name, decl in columns.items():
+                if name not in existing:
+                    conn.execute(f"ALTER TABLE {table} ADD COLUMN {name} {decl}")
+        conn.commit()
+    finally:
+        conn.close()
\ No newline at end of file
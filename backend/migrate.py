@@ -1,6 +1,6 @@
 #backend/migrate.py
 import pandas as pd
-from db import get_connection, init_db
+from db import get_connection, init_db, ensure_schema
 
 def migrate():
     init_db()
@@ -19,6 +19,9 @@ def migrate():
     interactions.to_sql("interactions", conn, if_exists="replace", index=False)
 
     conn.close()
+
+    # to_sql recreated the tables from the CSV columns; add what the API writes
+    ensure_schema()
     print("✅ Migration complete!")
 
 if __name__ == "__main__":
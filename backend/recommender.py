@@ -1,53 +1,280 @@
 import os
+import re
 import joblib
+from collections import OrderedDict
+from threading import Lock
 import numpy as np
 import pandas as pd
-from sklearn.metrics.pairwise import cosine_similarity
 from sklearn.preprocessing import normalize
 from .db import get_connection
 
+try:
+    from numba import njit
+except ImportError:  # optional; recommend() falls back to the NumPy blend
+    njit = None
+
+
+MOOD_BOOST = {
+    "positive": ["hiking", "sports", "dance", "gaming"],
+    "negative": ["yoga", "meditation", "relax"]
+}
+MOOD_BOOST_WEIGHT = 0.15
+
+# one alternation per mood: a single scan per tag string instead of one per keyword
+MOOD_PATTERNS = {
+    mood: re.compile("|".join(map(re.escape, keywords)))
+    for mood, keywords in MOOD_BOOST.items()
+}
+CF_CACHE_SIZE = 4096
+CONTENT_CACHE_SIZE = 4096
+
+# files train_cf replaces on a retrain
+CF_ARTIFACTS = (
+    "cf_user_map.joblib", "cf_item_map.joblib",
+    "cf_user_factors.npy", "cf_item_factors.npy", "cf_svd.joblib",
+)
+
+
+def models_version(models_dir: str = None) -> int:
+    """Newest mtime (ns) among the CF artifacts; changes whenever train_cf runs."""
+    models_dir = models_dir or os.path.join(os.path.dirname(__file__), "models")
+    version = 0
+    for name in CF_ARTIFACTS:
+        try:
+            version = max(version, os.stat(os.path.join(models_dir, name)).st_mtime_ns)
+        except FileNotFoundError:
+            pass
+    return version
+
+
+def _blend_kernel(content, cf, alpha, out):
+    """
+    Fused min-max normalize + hybrid blend:
+    out = alpha * norm(content) + (1 - alpha) * norm(cf), in two passes.
+    Like _normalize, min/max skip NaNs (nanmin/nanmax), NaN entries stay NaN
+    in the output and a constant input (max ~= min, as np.isclose)
+    contributes zeros.
+    """
+    n = content.shape[0]
+    if n == 0:
+        return
+
+    # NaN compares False, so NaNs never become the min or max
+    cmn = fmn = np.inf
+    cmx = fmx = -np.inf
+    for i in range(n):
+        c = content[i]
+        f = cf[i]
+        if c < cmn:
+            cmn = c
+        if c > cmx:
+            cmx = c
+        if f < fmn:
+            fmn = f
+        if f > fmx:
+            fmx = f
+
+    c_scale = 0.0
+    if abs(cmx - cmn) > 1e-8 + 1e-5 * abs(cmn):
+        c_scale = alpha / (cmx - cmn)
+    f_scale = 0.0
+    if abs(fmx - fmn) > 1e-8 + 1e-5 * abs(fmn):
+        f_scale = (1.0 - alpha) / (fmx - fmn)
+
+    for i in range(n):
+        out[i] = c_scale * (content[i] - cmn) + f_scale * (cf[i] - fmn)
+
+
+# no fastmath: it lets the compiler assume NaN-free inputs, which would break
+# the NaN handling above
+_fused_blend = njit(cache=True)(_blend_kernel) if njit is not None else None
+
 
 class Recommender:
-    def __init__(self, alpha: float = 0.6):
+    def __init__(self, alpha: float = 0.6, models_dir: str = None):
         self.alpha = alpha
 
-        models_dir = os.path.join(os.path.dirname(__file__), "models")
+        models_dir = models_dir or os.path.join(os.path.dirname(__file__), "models")
+        self.models_dir = models_dir
+        # read before loading: a retrain finishing mid-load shows up as a newer version
+        self.models_version = models_version(models_dir)
 
         self.vectorizer = joblib.load(os.path.join(models_dir, "vectorizer.joblib"))
-        self.activity_tfidf = joblib.load(os.path.join(models_dir, "activity_tfidf.joblib"))
+        self.activity_tfidf = joblib.load(
+            os.path.join(models_dir, "activity_tfidf.joblib")
+        ).astype(np.float32)
         self.activities_df = joblib.load(os.path.join(models_dir, "activities_df.joblib"))
 
         # CF (SVD)
         try:
             self.cf_user_map = joblib.load(os.path.join(models_dir, "cf_user_map.joblib"))
             self.cf_item_map = joblib.load(os.path.join(models_dir, "cf_item_map.joblib"))
-            self.cf_user_factors = np.load(os.path.join(models_dir, "cf_user_factors.npy"))
-            self.cf_item_factors = np.load(os.path.join(models_dir, "cf_item_factors.npy"))
+            # both factor files are memory-mapped so workers share the page
+            # cache; user factors touch one row per request. Item factors
+            # already saved as C-contiguous float32 stay mapped as-is; older
+            # float64 artifacts get a private float32 copy. Retraining is safe
+            # for live mappings because train_cf replaces files, never rewrites.
+            self.cf_user_factors = np.load(
+                os.path.join(models_dir, "cf_user_factors.npy"), mmap_mode="r"
+            )
+            self.cf_item_factors = np.ascontiguousarray(
+                np.load(os.path.join(models_dir, "cf_item_factors.npy"), mmap_mode="r"),
+                dtype=np.float32
+            )
+            # artifacts from two different trainings (loaded mid-retrain) don't line up
+            if (
+                self.cf_user_factors.shape[0] != len(self.cf_user_map)
+                or self.cf_item_factors.shape[0] != len(self.cf_item_map)
+                or self.cf_user_factors.shape[1] != self.cf_item_factors.shape[1]
+            ):
+                raise ValueError("CF artifacts are inconsistent")
             self.has_cf = True
         except:
             self.has_cf = False
 
         self.activity_ids_ordered = self.activities_df["activity_id"].astype(str).tolist()
 
+        self._seen_lock = Lock()
+        self._seen_rowid = 0
+        self._seen_version = {}  # user_id -> bumped whenever that user's seen set grows
+        self._seen_by_user = self._load_seen()
+        self._user_texts = self._load_user_texts()
+
+        # LRU score caches (user_id -> CF scores, user_text -> content scores);
+        # they live as long as this instance, i.e. until the next retrain
+        self._cf_cache = OrderedDict()
+        self._content_cache = OrderedDict()
+        self._cache_lock = Lock()
+
+        # column arrays cached once so recommend() never rebuilds Series
+        df = self.activities_df
+        has_city = "city" in df.columns
+
+        # to_numpy: with pandas' string dtype, .values is a StringArray, and
+        # indexing / comparing it goes through the extension-array code
+        self._tags_lower = df["tags"].fillna("").astype(str).str.lower().to_numpy(dtype=object)
+        self._city_lower = (
+            df["city"].fillna("").astype(str).str.lower().to_numpy(dtype=object) if has_city else None
+        )
+
+        # plain per-row dicts for result assembly (no pandas in the top-k loop)
+        self._row_records = df.to_dict(orient="records")
+        self._idx_by_id = {aid: i for i, aid in enumerate(self.activity_ids_ordered)}
+
+        # precomputed per-mood boost vectors (0.15 where any keyword matches)
+        self._mood_masks = {}
+        for mood, pat in MOOD_PATTERNS.items():
+            mask = np.fromiter(
+                (1 if pat.search(t) else 0 for t in self._tags_lower),
+                dtype=np.float32,
+                count=len(self._tags_lower)
+            )
+            self._mood_masks[mood] = mask * np.float32(MOOD_BOOST_WEIGHT)
+
     # -----------------------
     # USER INTEREST TEXT
     # -----------------------
-    def _user_text(self, user_id):
+    def _load_user_texts(self):
         try:
             conn = get_connection()
+            df = pd.read_sql("SELECT user_id, interests FROM users", conn)
+            conn.close()
+        except:
+            return {}
+
+        df = df.drop_duplicates("user_id").dropna(subset=["interests"])
+        texts = df["interests"].astype(str).str.replace(";", " ").str.lower()
+
+        return dict(zip(df["user_id"].astype(str), texts))
+
+    def _user_text(self, user_id):
+        return self._user_texts.get(user_id, "")
+
+    # -----------------------
+    # SEEN INDEX
+    # -----------------------
+    def _read_interactions(self):
+        """Interactions added since the last read (rowid is monotonic for appends)."""
+        conn = get_connection()
+        try:
             df = pd.read_sql(
-                "SELECT interests FROM users WHERE user_id = ?",
+                "SELECT rowid AS rid, user_id, activity_id FROM interactions WHERE rowid > ?",
                 conn,
-                params=(user_id,)
+                params=(self._seen_rowid,)
             )
+        finally:
             conn.close()
 
-            if not df.empty:
-                return df.iloc[0]["interests"].replace(";", " ").lower()
+        if len(df):
+            self._seen_rowid = int(df["rid"].max())
+        return df
+
+    def _load_seen(self):
+        try:
+            df = self._read_interactions()
         except:
-            pass
+            return {}
+
+        return {
+            str(uid): frozenset(g["activity_id"].astype(str))
+            for uid, g in df.groupby("user_id")
+        }
+
+    def refresh_seen(self):
+        """
+        Merge interactions written since the last load into the seen index.
+        With several worker processes, rows logged through another worker only
+        reach this one's index this way.
+        """
+        df = self._read_interactions()
+
+        for uid, g in df.groupby("user_id"):
+            uid = str(uid)
+            with self._seen_lock:
+                seen = self._seen_by_user.get(uid, frozenset())
+                self._seen_by_user[uid] = seen | set(g["activity_id"].astype(str))
+                self._seen_version[uid] = self._seen_version.get(uid, 0) + 1
+
+    def mark_seen(self, user_id, activity_id):
+        with self._seen_lock:
+            seen = self._seen_by_user.get(user_id, frozenset())
+            self._seen_by_user[user_id] = seen | {str(activity_id)}
+            self._seen_version[user_id] = self._seen_version.get(user_id, 0) + 1
+
+    def seen_version(self, user_id) -> int:
+        """Changes whenever user_id's seen set does; lets callers key caches on it."""
+        return self._seen_version.get(user_id, 0)
 
-        return ""
+    # -----------------------
+    # SCORE CACHES
+    # -----------------------
+    def _cached(self, cache, key, maxsize, compute):
+        with self._cache_lock:
+            scores = cache.get(key)
+            if scores is not None:
+                cache.move_to_end(key)
+                return scores
+
+        scores = compute()
+        scores.flags.writeable = False
+
+        with self._cache_lock:
+            cache[key] = scores
+            if len(cache) > maxsize:
+                cache.popitem(last=False)
+
+        return scores
+
+    # -----------------------
+    # CONTENT SCORE
+    # -----------------------
+    def _content_scores(self, user_text):
+        def compute():
+            # both sides are already L2-normalized, so cosine == dot product
+            user_vec = normalize(self.vectorizer.transform([user_text])).astype(np.float32)
+            return self.activity_tfidf.dot(user_vec.toarray().ravel())
+
+        return self._cached(self._content_cache, user_text, CONTENT_CACHE_SIZE, compute)
 
     # -----------------------
     # CF SCORE
@@ -56,11 +283,12 @@ class Recommender:
         if not self.has_cf or user_id not in self.cf_user_map:
             return None
 
-        uidx = self.cf_user_map[user_id]
-        user_vec = self.cf_user_factors[uidx]
-        scores = np.dot(self.cf_item_factors, user_vec)
+        def compute():
+            uidx = self.cf_user_map[user_id]
+            user_vec = np.asarray(self.cf_user_factors[uidx], dtype=np.float32)
+            return np.dot(self.cf_item_factors, user_vec)
 
-        return scores
+        return self._cached(self._cf_cache, user_id, CF_CACHE_SIZE, compute)
 
     # -----------------------
     # NORMALIZATION
@@ -94,6 +322,26 @@ class Recommender:
         except:
             return []
 
+    # -----------------------
+    # WARM-UP
+    # -----------------------
+    def warm_up(self):
+        """Throwaway recommendation so Numba compile / BLAS init happen at startup."""
+        self.recommend(user_id="", top_k=1, filter_seen=False)
+
+        if _fused_blend is not None:
+            # Numba specializes on writability too: cached score vectors are
+            # read-only, mood-boosted / zero-filled ones are not
+            rw = np.zeros(2, dtype=np.float32)
+            ro = rw.copy()
+            ro.flags.writeable = False
+            for content in (rw, ro):
+                for cf in (rw, ro):
+                    _fused_blend(content, cf, 0.5, np.empty(2))
+
+        if self.has_cf:
+            np.dot(self.cf_item_factors, self.cf_item_factors[0])
+
     # -----------------------
     # MAIN RECOMMEND
     # -----------------------
@@ -113,24 +361,17 @@ class Recommender:
         # CONTENT SCORE
         # -----------------------
         user_text = interests_override or self._user_text(user_id)
-        user_vec = normalize(self.vectorizer.transform([user_text]))
-        content_scores = cosine_similarity(user_vec, self.activity_tfidf).flatten()
+        content_scores = self._content_scores(user_text)
 
         # -----------------------
         # MOOD BOOST
         # -----------------------
         if mood:
             mood = mood.lower()
-            boost = {
-                "positive": ["hiking", "sports", "dance", "gaming"],
-                "negative": ["yoga", "meditation", "relax"]
-            }
-
-            tags_series = self.activities_df["tags"].fillna("").str.lower()
+            boost = self._mood_masks.get(mood)
 
-            for i, t in enumerate(tags_series):
-                if any(k in t for k in boost.get(mood, [])):
-                    content_scores[i] += 0.15
+            if boost is not None:
+                content_scores = content_scores + boost
 
         # -----------------------
         # CF SCORE
@@ -142,75 +383,76 @@ class Recommender:
         # -----------------------
         # HYBRID SCORING
         # -----------------------
-        content_norm = self._normalize(content_scores)
-        cf_norm = self._normalize(cf_scores)
-
         # dynamic alpha (smart)
         if user_text == "":
             alpha = 1.0   # cold start → content only
         else:
             alpha = alpha_override if alpha_override else self.alpha
 
-        final_scores = alpha * content_norm + (1 - alpha) * cf_norm
+        if _fused_blend is not None:
+            # the float32 score vectors go in as-is (the kernel is compiled
+            # per dtype); only the output is float64, as in the NumPy path
+            final_scores = np.empty(len(content_scores))
+            _fused_blend(content_scores, cf_scores, float(alpha), final_scores)
+        else:
+            content_norm = self._normalize(content_scores)
+            cf_norm = self._normalize(cf_scores)
+            final_scores = alpha * content_norm + (1 - alpha) * cf_norm
 
         idxs = np.arange(len(final_scores))
 
         # -----------------------
         # FILTERS
         # -----------------------
-        if city:
-            city_col = self.activities_df["city"].fillna("").str.lower()
-            idxs = idxs[city_col.iloc[idxs] == city.lower()]
+        if city and self._city_lower is not None:
+            idxs = idxs[self._city_lower[idxs] == city.lower()]
 
         if tags:
-            tcol = self.activities_df["tags"].fillna("").str.lower()
-            idxs = [i for i in idxs if any(tag in tcol.iloc[i] for tag in tags)]
+            pat = "|".join(re.escape(t.lower()) for t in tags)
+            candidate_tags = pd.Series(self._tags_lower[idxs])
+            mask = candidate_tags.str.contains(pat, regex=True, na=False).values
+            idxs = idxs[mask]
 
         # -----------------------
         # SEEN FILTER
         # -----------------------
-        seen = set()
-
-        if filter_seen:
-            try:
-                conn = get_connection()
-                df = pd.read_sql(
-                    "SELECT activity_id FROM interactions WHERE user_id = ?",
-                    conn,
-                    params=(user_id,)
-                )
-                conn.close()
-
-                seen = set(df["activity_id"].astype(str))
-            except:
-                pass
+        seen = self._seen_by_user.get(user_id, frozenset()) if filter_seen else frozenset()
 
         # -----------------------
         # RANKING
         # -----------------------
-        order = np.argsort(-final_scores[idxs])
+        # only top_k (+ seen items that may be skipped) need sorting;
+        # that bound guarantees the loop below never runs short
+        neg_scores = -final_scores[idxs]
+        k = min(top_k + len(seen), len(neg_scores))
+
+        if k < len(neg_scores):
+            part = np.argpartition(neg_scores, k - 1)[:k]
+            order = part[np.argsort(neg_scores[part])]
+        else:
+            order = np.argsort(neg_scores)
 
         results = []
 
         for j in order:
             idx = idxs[j]
-            aid = str(self.activity_ids_ordered[idx])
+            aid = self.activity_ids_ordered[idx]
 
             if aid in seen:
                 continue
 
-            row = self.activities_df.iloc[idx]
-
             # 🧠 EXPLANATION (NEW)
             reason = "Recommended based on your interests"
             if mood:
                 reason += f" and your mood ({mood})"
 
+            r = self._row_records[idx]
+
             results.append({
                 "activity_id": aid,
-                "title": row.get("title"),
-                "tags": row.get("tags"),
-                "city": row.get("city"),
+                "title": r.get("title"),
+                "tags": r.get("tags"),
+                "city": r.get("city"),
                 "score": float(final_scores[idx]),
                 "content_score": float(content_scores[idx]),
                 "cf_score": float(cf_scores[idx]),
@@ -227,20 +469,18 @@ class Recommender:
             popular = self._get_popular()
 
             for aid in popular:
-                row = self.activities_df[
-                    self.activities_df["activity_id"] == aid
-                ]
+                idx = self._idx_by_id.get(str(aid))
 
-                if row.empty:
+                if idx is None:
                     continue
 
-                row = row.iloc[0]
+                r = self._row_records[idx]
 
                 results.append({
                     "activity_id": aid,
-                    "title": row.get("title"),
-                    "tags": row.get("tags"),
-                    "city": row.get("city"),
+                    "title": r.get("title"),
+                    "tags": r.get("tags"),
+                    "city": r.get("city"),
                     "score": 0.0,
                     "content_score": 0.0,
                     "cf_score": 0.0,
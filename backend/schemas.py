@@ -1,9 +1,14 @@
 # backend/schemas.py
 from typing import List, Optional, Literal
-from pydantic import BaseModel, Field, constr, conlist, confloat
+from pydantic import BaseModel, ConfigDict, Field, constr, conlist, confloat
+
+# request models: build validators at import time, never on first request
+REQUEST_CONFIG = ConfigDict(defer_build=False, validate_assignment=False)
 
 # --- Sentiment ---
 class SentimentRequest(BaseModel):
+    model_config = REQUEST_CONFIG
+
     text: constr(strip_whitespace=True, min_length=1, max_length=2000)
 
 class SentimentResponse(BaseModel):
@@ -12,6 +17,8 @@ class SentimentResponse(BaseModel):
 
 # --- Recommend ---
 class RecommendRequest(BaseModel):
+    model_config = REQUEST_CONFIG
+
     user_id: constr(strip_whitespace=True, min_length=1, max_length=64)
     top_k: int = Field(5, ge=1, le=50)
     mood_text: Optional[constr(strip_whitespace=True, max_length=2000)] = None
@@ -40,6 +47,8 @@ class RecommendationResponse(BaseModel):
 
 # --- Interaction logging ---
 class LogInteractionRequest(BaseModel):
+    model_config = REQUEST_CONFIG
+
     user_id: str
     activity_id: str
     event: Literal["view", "click", "like", "rate"] = "view"
@@ -51,6 +60,8 @@ class LogInteractionResponse(BaseModel):
 
 # --- Admin retrain ---
 class RetrainCFRequest(BaseModel):
+    model_config = REQUEST_CONFIG
+
     n_factors: int = Field(50, ge=2, le=512)
 
 class RetrainResponse(BaseModel):
@@ -1,12 +1,29 @@
 #backend/sentiment.py
+import re
+import asyncio
 from transformers import pipeline
 import logging
 
 logger = logging.getLogger("ActiReco")
 
+# micro-batching: flush when this many texts are queued or after BATCH_WAIT seconds
+BATCH_SIZE = 16
+BATCH_WAIT = 0.005
+
 class SentimentModel:
     """Robust HuggingFace sentiment model wrapper."""
 
+    # single-word inputs answered without a model forward pass
+    POSITIVE_WORDS = frozenset({
+        "happy", "good", "great", "excited", "awesome", "amazing", "fantastic",
+        "joyful", "glad", "cheerful", "energetic", "wonderful", "love", "fine"
+    })
+    NEGATIVE_WORDS = frozenset({
+        "sad", "bad", "angry", "depressed", "tired", "stressed", "anxious",
+        "upset", "lonely", "bored", "awful", "terrible", "unhappy", "exhausted"
+    })
+    _TOKEN_RE = re.compile(r"[a-z]+")
+
     def __init__(self):
         try:
             self.classifier = pipeline(
@@ -15,31 +32,157 @@ class SentimentModel:
             )
             logger.info("✅ Sentiment model loaded successfully")
         except Exception as e:
-            logger.error(f"⚠️ Failed to load sentiment model: {e}")
+            logger.error("⚠️ Failed to load sentiment model: %s", e)
             self.classifier = None
 
+        self._queue = None
+        self._loop = None
+        self._worker = None
+
+    @staticmethod
+    def _to_mood(label: str) -> str:
+        label = label.lower()
+
+        if label in ["positive", "negative", "neutral"]:
+            return label
+        elif label in ["label_0", "1 star", "2 stars"]:
+            return "negative"
+        elif label in ["label_1", "3 stars"]:
+            return "neutral"
+        elif label in ["label_2", "4 stars", "5 stars"]:
+            return "positive"
+        else:
+            return "neutral"
+
+    def _lexicon_mood(self, text: str):
+        tokens = self._TOKEN_RE.findall(text.lower())
+        if len(tokens) != 1:
+            return None
+
+        if tokens[0] in self.POSITIVE_WORDS:
+            return "positive"
+        if tokens[0] in self.NEGATIVE_WORDS:
+            return "negative"
+        return None
+
     def analyze(self, text: str) -> str:
         if not text or not text.strip():
             return "neutral"
 
+        mood = self._lexicon_mood(text)
+        if mood:
+            return mood
+
         if not self.classifier:
             logger.warning("Sentiment fallback: model not available")
             return "neutral"
 
         try:
             result = self.classifier(text)[0]
-            label = result["label"].lower()
-
-            if label in ["positive", "negative", "neutral"]:
-                return label
-            elif label in ["label_0", "1 star", "2 stars"]:
-                return "negative"
-            elif label in ["label_1", "3 stars"]:
-                return "neutral"
-            elif label in ["label_2", "4 stars", "5 stars"]:
-                return "positive"
-            else:
-                return "neutral"
+            return self._to_mood(result["label"])
+        except Exception as e:
+            logger.error("⚠️ Sentiment analysis failed: %s", e)
+            return "neutral"
+
+    def warm_up(self):
+        """One forward pass at startup so the first real request isn't the slow one."""
+        if self.classifier:
+            self.analyze("warm up")
+
+    # -----------------------
+    # BATCHED (ASYNC)
+    # -----------------------
+    async def analyze_async(self, text: str) -> str:
+        """Like analyze(), but coalesces concurrent calls into one pipeline batch."""
+        if not text or not text.strip():
+            return "neutral"
+
+        mood = self._lexicon_mood(text)
+        if mood:
+            return mood
+
+        if not self.classifier:
+            logger.warning("Sentiment fallback: model not available")
+            return "neutral"
+
+        loop = asyncio.get_running_loop()
+
+        # queue and worker are bound to the loop that created them
+        if self._loop is not loop or self._worker.done():
+            self._loop = loop
+            self._queue = asyncio.Queue()
+            self._worker = loop.create_task(self._batch_worker())
+
+        future = loop.create_future()
+        await self._queue.put((text, future))
+        return await future
+
+    def _analyze_batch(self, texts):
+        try:
+            results = self.classifier(texts, batch_size=BATCH_SIZE, truncation=True)
+            return [self._to_mood(r["label"]) for r in results]
         except Exception as e:
-            logger.error(f"⚠️ Sentiment analysis failed: {e}")
-            return "neutral"
\ No newline at end of file
+            logger.error("⚠️ Sentiment analysis failed: %s", e)
+            return ["neutral"] * len(texts)
+
+    async def _batch_worker(self):
+        loop = asyncio.get_running_loop()
+        queue = self._queue
+        batch = []
+
+        try:
+            while True:
+                batch = [await queue.get()]
+                deadline = loop.time() + BATCH_WAIT
+
+                while len(batch) < BATCH_SIZE:
+                    timeout = deadline - loop.time()
+                    if timeout <= 0:
+                        break
+                    try:
+                        batch.append(await asyncio.wait_for(queue.get(), timeout))
+                    except asyncio.TimeoutError:
+                        break
+
+                texts = [text for text, _ in batch]
+                try:
+                    moods = await loop.run_in_executor(None, self._analyze_batch, texts)
+                except Exception as e:  # e.g. executor already shut down
+                    logger.error("⚠️ Sentiment batch failed: %s", e)
+                    for _, future in batch:
+                        if not future.done():
+                            future.set_exception(e)
+                    continue
+
+                for (_, future), mood in zip(batch, moods):
+                    if not future.done():
+                        future.set_result(mood)
+        finally:
+            # cancelled (shutdown) or crashed: fail everyone still waiting
+            # instead of leaving them blocked on futures nobody will resolve
+            self._fail_pending(batch, queue)
+
+    @staticmethod
+    def _fail_pending(batch, queue):
+        while not queue.empty():
+            batch.append(queue.get_nowait())
+        for _, future in batch:
+            if not future.done():
+                future.set_exception(RuntimeError("sentiment batcher stopped"))
+
+    async def close(self):
+        """Stop the batch worker (app shutdown). A later analyze_async starts a new one."""
+        worker, queue = self._worker, self._queue
+        self._loop = self._queue = self._worker = None
+
+        if worker is None or worker.get_loop() is not asyncio.get_running_loop():
+            return
+
+        worker.cancel()
+        try:
+            await worker
+        except asyncio.CancelledError:
+            pass
+
+        # a worker cancelled before it first ran never reaches its finally
+        self._fail_pending([], queue)
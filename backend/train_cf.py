@@ -1,20 +1,39 @@
 # backend/train_cf.py
 import os
+import tempfile
 import numpy as np
 import pandas as pd
 from scipy.sparse import csr_matrix
 from sklearn.decomposition import TruncatedSVD
 import joblib
 
-def build_and_save_cf(n_factors: int = 50):
+def _atomic_save(path, write):
+    """
+    Write an artifact to a temp file in the same directory, then os.replace()
+    it over `path`. Recommenders that have the old .npy memory-mapped keep
+    reading the old inode; overwriting it in place would truncate the mapping
+    under them (SIGBUS) or swap rows behind their user/item maps.
+    """
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            write(f)
+        os.chmod(tmp, 0o644)  # mkstemp creates 0600; keep the usual artifact mode
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+
+def build_and_save_cf(n_factors: int = 50, models_dir: str = None):
     """
     Build Collaborative Filtering (CF) model using TruncatedSVD
-    and persist all artifacts under backend/models/.
+    and persist all artifacts under models_dir (default backend/models/).
     """
     base = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
     interactions_path = os.path.join(base, "data", "interactions.csv")
     activities_path = os.path.join(base, "data", "activities.csv")
-    models_dir = os.path.join(os.path.dirname(__file__), "models")
+    models_dir = models_dir or os.path.join(os.path.dirname(__file__), "models")
     os.makedirs(models_dir, exist_ok=True)
 
     # Load data
@@ -31,29 +50,30 @@ def build_and_save_cf(n_factors: int = 50):
     user_to_idx = {uid: i for i, uid in enumerate(user_ids)}
     n_users = len(user_ids)
 
-    # Build lists for sparse matrix
-    rows, cols, data = [], [], []
-    for _, r in inter.iterrows():
-        uid = str(r["user_id"])
-        aid = str(r["activity_id"])
-        if uid not in user_to_idx or aid not in item_to_idx:
-            continue
-        uidx = user_to_idx[uid]
-        iidx = item_to_idx[aid]
-        rating = r.get("rating", None)
-        if pd.isna(rating) or rating is None:
-            rating = r.get("liked", 1)
-        try:
-            val = float(rating)
-        except:
-            val = 1.0
-        rows.append(uidx)
-        cols.append(iidx)
-        data.append(val)
+    # Map ids to matrix positions; drop rows for unknown activities
+    inter = inter.assign(
+        uidx=inter["user_id"].astype(str).map(user_to_idx),
+        iidx=inter["activity_id"].astype(str).map(item_to_idx),
+    ).dropna(subset=["uidx", "iidx"])
+
+    # rating, falling back to liked (then 1.0) when missing or non-numeric
+    if "liked" in inter:
+        fallback = pd.to_numeric(inter["liked"], errors="coerce").fillna(1.0)
+    else:
+        fallback = pd.Series(1.0, index=inter.index)
+
+    if "rating" in inter:
+        data = pd.to_numeric(inter["rating"], errors="coerce").fillna(fallback)
+    else:
+        data = fallback
 
     if len(data) == 0:
         raise RuntimeError("No interaction data found matching activities/users. Check interactions.csv and activities.csv.")
 
+    rows = inter["uidx"].astype(int).values
+    cols = inter["iidx"].astype(int).values
+    data = data.astype(float).values
+
     R = csr_matrix((data, (rows, cols)), shape=(n_users, n_items))
 
     # determine n_components safely
@@ -65,12 +85,19 @@ def build_and_save_cf(n_factors: int = 50):
     user_factors = svd.fit_transform(R)       # shape (n_users, k)
     item_factors = svd.components_.T          # shape (n_items, k)
 
-    # Save artifacts persistently
-    joblib.dump(user_to_idx, os.path.join(models_dir, "cf_user_map.joblib"))
-    joblib.dump(item_to_idx, os.path.join(models_dir, "cf_item_map.joblib"))
-    np.save(os.path.join(models_dir, "cf_user_factors.npy"), user_factors)
-    np.save(os.path.join(models_dir, "cf_item_factors.npy"), item_factors)
-    joblib.dump(svd, os.path.join(models_dir, "cf_svd.joblib"))
+    # float32, C-contiguous: halves bandwidth for the per-request matvec
+    user_factors = np.ascontiguousarray(user_factors, dtype=np.float32)
+    item_factors = np.ascontiguousarray(item_factors, dtype=np.float32)
+
+    # Save artifacts persistently (each one replaced atomically)
+    def path(name):
+        return os.path.join(models_dir, name)
+
+    _atomic_save(path("cf_user_map.joblib"), lambda f: joblib.dump(user_to_idx, f))
+    _atomic_save(path("cf_item_map.joblib"), lambda f: joblib.dump(item_to_idx, f))
+    _atomic_save(path("cf_user_factors.npy"), lambda f: np.save(f, user_factors))
+    _atomic_save(path("cf_item_factors.npy"), lambda f: np.save(f, item_factors))
+    _atomic_save(path("cf_svd.joblib"), lambda f: joblib.dump(svd, f))
 
     print("✅ CF model saved to:", models_dir)
     print("Users:", user_factors.shape[0], "Items:", item_factors.shape[0], "Latent dim:", user_factors.shape[1])
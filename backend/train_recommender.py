@@ -1,5 +1,6 @@
 # backend/train_recommender.py
 import os
+import numpy as np
 import pandas as pd
 from sklearn.feature_extraction.text import TfidfVectorizer
 from sklearn.preprocessing import normalize
@@ -23,6 +24,11 @@ def build_and_save_models():
     X = vectorizer.fit_transform(df["text"].tolist())
     X = normalize(X)  # normalize rows (good practice for cosine similarity)
 
+    # float32 data + int32 indices: half the bytes for the per-request SpMV
+    X = X.astype(np.float32)
+    X.indices = X.indices.astype(np.int32)
+    X.indptr = X.indptr.astype(np.int32)
+
     # Save artifacts
     joblib.dump(vectorizer, os.path.join(models_dir, "vectorizer.joblib"))
     joblib.dump(X, os.path.join(models_dir, "activity_tfidf.joblib"))
@@ -1,18 +1,66 @@
 # run.py
+import os
+import logging
 import uvicorn
 import sys
 from backend import config
 
+logger = logging.getLogger("actireco")
+
+try:
+    # C event loop + HTTP parser shipped with `uvicorn[standard]`
+    import uvloop  # noqa: F401
+    import httptools  # noqa: F401
+    LOOP, HTTP = "uvloop", "httptools"
+except ImportError:
+    # e.g. Windows, where uvloop is unavailable
+    LOOP, HTTP = "auto", "auto"
+
+# in DEBUG, only restart on backend source changes (not tests/data/models);
+# watchfiles (from uvicorn[standard]) is used for the watching when installed
+RELOAD_OPTIONS = dict(
+    reload_dirs=[os.path.join(config.base_dir, "backend")],
+    reload_includes=["*.py"],
+    reload_excludes=["tests/*", "*.csv", "*.pkl", "*.joblib", "*.npy"],
+) if config.DEBUG else {}
+
+
+def warm_page_cache():
+    """
+    Read the CF factor files once through mmap before workers start, so the
+    OS page cache holds them and every worker's np.load(mmap_mode="r") maps
+    the same physical pages instead of reading its own copy from disk.
+    """
+    import numpy as np
+
+    for name in ("cf_user_factors.npy", "cf_item_factors.npy"):
+        path = os.path.join(config.MODELS_DIR, name)
+        if os.path.exists(path):
+            np.load(path, mmap_mode="r").sum()
+
+
 if __name__ == "__main__":
-    try:
-        print(f"🚀 Starting ActiReco at http://{config.HOST}:{config.PORT} (debug={config.DEBUG})")
-        uvicorn.run(
-            "backend.app:app",
-            host=config.HOST,
-            port=config.PORT,
-            reload=config.DEBUG,   # auto-reload only if DEBUG=true
-            log_level="debug" if config.DEBUG else "info",
-        )
-    except Exception as e:
-        print(f"❌ Failed to start ActiReco: {e}", file=sys.stderr)
-        sys.exit(1)
\ No newline at end of file
+    logging.basicConfig(level=logging.INFO, stream=sys.stderr, format="%(levelname)s:     %(message)s")
+    if not config.DEBUG:
+        warm_page_cache()
+
+    # no try/except: uvicorn logs bind errors (port in use, permission
+    # denied) itself and exits with a non-zero status
+    logger.info("Starting ActiReco at http://%s:%d (debug=%s)", config.HOST, config.PORT, config.DEBUG)
+    uvicorn.run(
+        "backend.app:create_app",
+        factory=True,   # each worker / reloader child builds its own app
+        host=config.HOST,
+        port=config.PORT,
+        reload=config.DEBUG,   # auto-reload only if DEBUG=true
+        # one process per core for CPU-bound inference; reload needs a single worker.
+        # For production you can also use: gunicorn -k uvicorn.workers.UvicornWorker 'backend.app:create_app()'
+        workers=1 if config.DEBUG else config.WORKERS,
+        loop=LOOP,
+        http=HTTP,
+        # "debug" would format every access record; outside DEBUG the
+        # per-request access lines are dropped altogether
+        log_level="info",
+        access_log=config.DEBUG,
+        **RELOAD_OPTIONS,
+    )
\ No newline at end of file
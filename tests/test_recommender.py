@@ -0,0 +1,96 @@
+# tests/test_recommender.py
+import json
+import os
+import shutil
+import sqlite3
+
+import numpy as np
+import pytest
+
+db = pytest.importorskip("backend.db")
+recommender = pytest.importorskip("backend.recommender")
+train_cf = pytest.importorskip("backend.train_cf")
+
+
+# recommend() output of the pre-optimization implementation on the shipped
+# models and database; ranking must match exactly, scores to float32 precision
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), "data", "recommender_baseline.json")
+
+with open(BASELINE_PATH) as f:
+    BASELINE = json.load(f)
+
+
+@pytest.fixture(scope="module")
+def rec():
+    return recommender.Recommender()
+
+
+@pytest.mark.parametrize("case", BASELINE, ids=lambda c: ",".join(f"{k}={v}" for k, v in c["args"].items()))
+def test_recommend_matches_baseline(rec, case):
+    got = rec.recommend(**case["args"])
+    expected = case["expected"]
+
+    assert [r["activity_id"] for r in got] == [r["activity_id"] for r in expected]
+    for g, e in zip(got, expected):
+        for key, value in e.items():
+            if isinstance(value, float):
+                assert g[key] == pytest.approx(value, abs=1e-5), key
+            else:
+                assert g[key] == value, key
+
+
+@pytest.fixture
+def db_copy(tmp_path, monkeypatch):
+    """Point the recommender at a scratch copy of the shipped database."""
+    path = tmp_path / "actireco.db"
+    shutil.copy(db.DB_PATH, path)
+    monkeypatch.setattr(db, "DB_PATH", str(path))
+    return path
+
+
+def test_refresh_seen_picks_up_rows_from_other_writers(db_copy):
+    rec = recommender.Recommender()
+    first = rec.recommend(user_id="u1", top_k=1)[0]["activity_id"]
+
+    # another worker process logs an interaction straight into SQLite
+    conn = sqlite3.connect(db_copy)
+    conn.execute("INSERT INTO interactions (user_id, activity_id) VALUES (?, ?)", ("u1", first))
+    conn.commit()
+    conn.close()
+
+    assert rec.recommend(user_id="u1", top_k=1)[0]["activity_id"] == first
+
+    rec.refresh_seen()
+    assert first not in [r["activity_id"] for r in rec.recommend(user_id="u1", top_k=5)]
+
+
+def test_retrain_keeps_live_recommender_intact(tmp_path):
+    models_dir = tmp_path / "models"
+    shutil.copytree(os.path.join(os.path.dirname(recommender.__file__), "models"), models_dir)
+
+    old = recommender.Recommender(models_dir=str(models_dir))
+    assert isinstance(old.cf_user_factors, np.memmap)
+    users = list(old.cf_user_map)
+    before = [old.recommend(user_id=u) for u in users]
+
+    # fewer factors => smaller .npy files; rewriting the mapped files in place
+    # would SIGBUS the next read or feed old maps new rows
+    old._cf_cache.clear()
+    train_cf.build_and_save_cf(n_factors=2, models_dir=str(models_dir))
+
+    assert [old.recommend(user_id=u) for u in users] == before
+
+    new = recommender.Recommender(models_dir=str(models_dir))
+    assert new.cf_user_factors.shape[1] <= 2
+    assert new.models_version == recommender.models_version(str(models_dir)) > old.models_version
+
+
+def test_mismatched_cf_artifacts_disable_cf(tmp_path):
+    models_dir = tmp_path / "models"
+    shutil.copytree(os.path.join(os.path.dirname(recommender.__file__), "models"), models_dir)
+
+    # a worker loading mid-retrain: new user factors next to the old user map
+    factors = np.load(models_dir / "cf_user_factors.npy")
+    np.save(models_dir / "cf_user_factors.npy", factors[:-1])
+
+    assert not recommender.Recommender(models_dir=str(models_dir)).has_cf
@@ -0,0 +1,63 @@
+# tests/test_sentiment.py
+import asyncio
+
+import pytest
+
+sentiment = pytest.importorskip("backend.sentiment")
+
+
+class FakeClassifier:
+    """Stands in for the HF pipeline; records how many forward passes ran."""
+
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, texts, **kwargs):
+        if isinstance(texts, str):
+            texts = [texts]
+        self.calls.append(list(texts))
+        return [{"label": "POSITIVE"} for _ in texts]
+
+
+@pytest.fixture
+async def model(monkeypatch):
+    classifier = FakeClassifier()
+    monkeypatch.setattr(sentiment, "pipeline", lambda *args, **kwargs: classifier)
+    m = sentiment.SentimentModel()
+    yield m
+    await m.close()
+
+
+async def test_analyze_async_batches_concurrent_calls(model):
+    texts = [f"what a day number {i}" for i in range(5)]
+    moods = await asyncio.gather(*(model.analyze_async(t) for t in texts))
+
+    assert moods == ["positive"] * 5
+    assert model.classifier.calls == [texts]
+
+
+async def test_analyze_async_fails_instead_of_hanging(model, monkeypatch):
+    def broken(texts):
+        raise RuntimeError("executor gone")
+
+    monkeypatch.setattr(model, "_analyze_batch", broken)
+
+    with pytest.raises(RuntimeError, match="executor gone"):
+        await asyncio.wait_for(model.analyze_async("what a day"), timeout=5)
+
+    # the worker survives a failed batch
+    monkeypatch.undo()
+    assert await asyncio.wait_for(model.analyze_async("what a day"), timeout=5) == "positive"
+
+
+async def test_close_fails_pending_callers(model):
+    # enqueue without awaiting the answer, then shut the worker down
+    pending = asyncio.ensure_future(model.analyze_async("what a day"))
+    await asyncio.sleep(0)
+    await model.close()
+
+    with pytest.raises(RuntimeError):
+        await asyncio.wait_for(pending, timeout=5)
+
+    # a fresh worker is started on the next call
+    assert await model.analyze_async("what a day") == "positive"